@@ -0,0 +1 @@
+../maelstrom/maelstrom test -w kafka --bin ./src/kafka.py --node-count 2 --concurrency 2n --time-limit 20 --rate 1000 --log-stderr
\ No newline at end of file
@@ -0,0 +1 @@
+../maelstrom/maelstrom test -w txn-rw-register --bin ./src/txn_rw_register.py --node-count 2 --concurrency 2n --time-limit 20 --rate 1000 --consistency-models read-committed --availability total --nemesis partition --log-stderr
\ No newline at end of file
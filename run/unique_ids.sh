@@ -0,0 +1 @@
+../maelstrom/maelstrom test -w unique-ids --bin ./src/unique_ids.py --time-limit 30 --rate 1000 --node-count 3 --availability total --nemesis partition --log-stderr
\ No newline at end of file
@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+
+if __name__ == "__main__":
+
+    from main import Workbench, main
+
+    try:
+        main(Workbench.KAFKA)
+    except KeyboardInterrupt:
+        exit()
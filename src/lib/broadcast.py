@@ -1,11 +1,9 @@
 #!/usr/bin/env python
 
-import fileinput
-import json
-from threading import Thread
 from time import sleep
 from typing import Any
 
+from lib.checkpoint import Checkpoint
 from lib.node import Node
 
 
@@ -14,6 +12,21 @@ class BroadcastNode(Node):
         super().__init__()
         self.neighbours: list[str] = []
         self.messages: set[Any] = set()
+        self.checkpoint: Checkpoint | None = None
+
+    def init(self, node_id: str, node_ids: list[str]) -> None:
+        super().init(node_id, node_ids)
+
+        self.checkpoint = Checkpoint.open(
+            name="broadcast",
+            node_id=node_id,
+            snapshot=lambda: [list(self.messages)],
+        )
+        if self.checkpoint:
+            for messages in self.checkpoint.load():
+                self.messages.update(messages)
+            self.repeat(dt_s=5, f=self.checkpoint.compact)
+            self.run_tasks()
 
     def set_neighbours(self, neighbours: list[str]) -> None:
         self.neighbours = neighbours
@@ -23,6 +36,8 @@ class BroadcastNode(Node):
             return False
         else:
             self.messages.add(message)
+            if self.checkpoint:
+                self.checkpoint.append([message])
             return True
 
 
@@ -66,19 +81,7 @@ def handle_message(node: BroadcastNode, req: dict) -> None:
 
 def run():
     node = BroadcastNode()
-    # files=["-"] means read from sys.stdin
-
-    for line in fileinput.input(files=["-"]):
-        req = json.loads(line)
-
-        handler = None
-        if msg_id := req.get("body", {}).get("in_reply_to"):
-            callback = node.callbacks.pop(msg_id)
-            handler = lambda: callback(req)
-        else:
-            handler = lambda: handle_message(node=node, req=req)
-
-        Thread(target=handler).start()
+    node.serve(handler=lambda req: handle_message(node=node, req=req))
 
 
 if __name__ == "__main__":
@@ -12,3 +12,5 @@ class CRDT(Protocol):
     def merge(self, other: Any) -> "CRDT": ...
 
     def add(self, element: Any) -> "CRDT": ...
+
+    def delta(self, since: Any) -> Any: ...
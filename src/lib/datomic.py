@@ -1,11 +1,9 @@
 #!/usr/bin/env python
 
 import asyncio
-import fileinput
-import json
 from enum import StrEnum
 from functools import reduce
-from threading import Semaphore, Thread
+from threading import Semaphore
 from typing import Any
 
 from lib.node import Node
@@ -112,22 +110,11 @@ class Transactor:
                 raise Exception(f"Unknown message type {t}")
 
     def handle(self, req: dict):
-        handler = None
-        if msg_id := req.get("body", {}).get("in_reply_to"):
-            callback = self.node.callbacks.pop(msg_id)
-            handler = lambda: callback(req)
-            Thread(target=handler).start()
-        else:
-            Thread(
-                target=asyncio.run, args=(self.handle_message_async(req=req),)
-            ).start()
+        asyncio.run(self.handle_message_async(req=req))
 
 def run():
     transactor = Transactor()
-
-    for line in fileinput.input(files=["-"]):
-        req = json.loads(line)
-        transactor.handle(req)
+    transactor.node.serve(handler=transactor.handle)
 
 
 if __name__ == "__main__":
@@ -1,30 +1,28 @@
 #!/usr/bin/env python
 
-import fileinput
-import json
-
 from lib.node import Node
 
 
+def handle_message(node: Node, req: dict) -> None:
+    match req.get("body", {}).get("type"):
+        case "init":
+            node.init(
+                node_id=req.get("body", {}).get("node_id"),
+                node_ids=req.get("body", {}).get("node_ids"),
+            )
+            node.reply(req, body={"type": "init_ok"})
+        case "echo":
+            node.reply(
+                req,
+                body={"type": "echo_ok", "echo": req.get("body", {}).get("echo")},
+            )
+        case t:
+            raise Exception(f"Unknown message type {t}")
+
+
 def run():
     node = Node()
-    # files=["-"] means read from sys.stdin
-    for line in fileinput.input(files=["-"]):
-        req = json.loads(line)
-        match req.get("body", {}).get("type"):
-            case "init":
-                node.init(
-                    node_id=req.get("body", {}).get("node_id"),
-                    node_ids=req.get("body", {}).get("node_ids"),
-                )
-                node.reply(req, body={"type": "init_ok"})
-            case "echo":
-                node.reply(
-                    req,
-                    body={"type": "echo_ok", "echo": req.get("body", {}).get("echo")},
-                )
-            case t:
-                raise Exception(f"Unknown message type {t}")
+    node.serve(handler=lambda req: handle_message(node=node, req=req), threaded=False)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,8 @@
 #!/usr/bin/env python
 
-import fileinput
-import json
-from threading import Thread
 from typing import Self
 
+from lib.checkpoint import Checkpoint
 from lib.crdt import CRDT
 from lib.node import Node
 from lib.semaphore_context import lock
@@ -41,15 +39,29 @@ class GCounter:
 
         return type(self)(result)
 
+    def delta(self, since: Self) -> dict:
+        return {k: v for k, v in self.data.items() if since.data.get(k, 0) < v}
+
 
 class CRDTServer(Node):
     def __init__(self, crdt: CRDT):
         super().__init__()
         self.crdt = crdt
+        self.checkpoint: Checkpoint | None = None
 
     def init(self, node_id, node_ids):
         super().init(node_id, node_ids)
 
+        self.checkpoint = Checkpoint.open(
+            name="g_counter",
+            node_id=node_id,
+            snapshot=lambda: [self.crdt.to_serializable()],
+        )
+        if self.checkpoint:
+            for value in self.checkpoint.load():
+                self.crdt = self.crdt.merge(self.crdt.from_serializable(value))
+            self.repeat(dt_s=5, f=self.checkpoint.compact)
+
         def sync():
             for id in filter(lambda x: x != self.node_id, self.node_ids):
                 self.send(
@@ -65,16 +77,26 @@ class CRDTServer(Node):
 
     def add(self, req: dict) -> None:
         with lock(self.lock):
+            before = self.crdt
             self.crdt = self.crdt.add(
                 {"node_id": req["src"], "delta": req["body"]["delta"]}
             )
+            delta = self.crdt.delta(before)
+        # Only the entries that changed are logged; merging them back on load
+        # restores the state.
+        if self.checkpoint and delta:
+            self.checkpoint.append(delta)
         self.reply(req=req, body={"type": "add_ok"})
 
     def replicate(self, req: dict) -> None:
         with lock(self.lock):
+            before = self.crdt
             self.crdt = self.crdt.merge(
                 self.crdt.from_serializable(req["body"]["value"])
             )
+            delta = self.crdt.delta(before)
+        if self.checkpoint and delta:
+            self.checkpoint.append(delta)
 
     def handle_message(self, req: dict) -> None:
         match req.get("body", {}).get("type"):
@@ -97,18 +119,7 @@ class CRDTServer(Node):
 
 def run():
     node = CRDTServer(crdt=GCounter())
-
-    for line in fileinput.input(files=["-"]):
-        req = json.loads(line)
-
-        handler = None
-        if msg_id := req.get("body", {}).get("in_reply_to"):
-            callback = node.callbacks.pop(msg_id)
-            handler = lambda: callback(req)
-        else:
-            handler = lambda: node.handle_message(req=req)
-
-        Thread(target=handler).start()
+    node.serve(handler=node.handle_message)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,8 @@
 #!/usr/bin/env python
 
-import fileinput
-import json
-from threading import Thread
 from typing import Any
 
+from lib.checkpoint import Checkpoint
 from lib.crdt import CRDT
 from lib.node import Node
 from lib.semaphore_context import lock
@@ -33,6 +31,9 @@ class GSet:
     def add(self, element: Any) -> "GSet":
         return GSet(self.data.union([element]))
 
+    def delta(self, since: "GSet") -> list:
+        return list(self.data - since.data)
+
 
 class Counter:
     def __init__(self, value: dict | None = None):
@@ -73,10 +74,21 @@ class CRDTServer(Node):
     def __init__(self, crdt: CRDT):
         super().__init__()
         self.crdt = crdt
+        self.checkpoint: Checkpoint | None = None
 
     def init(self, node_id, node_ids):
         super().init(node_id, node_ids)
 
+        self.checkpoint = Checkpoint.open(
+            name="g_set",
+            node_id=node_id,
+            snapshot=lambda: [self.crdt.to_serializable()],
+        )
+        if self.checkpoint:
+            for value in self.checkpoint.load():
+                self.crdt = self.crdt.merge(value)
+            self.repeat(dt_s=5, f=self.checkpoint.compact)
+
         def sync():
             for id in filter(lambda x: x != self.node_id, self.node_ids):
                 self.send(
@@ -91,12 +103,22 @@ class CRDTServer(Node):
 
     def add(self, req: dict) -> None:
         with lock(self.lock):
+            before = self.crdt
             self.crdt = self.crdt.add(req["body"]["element"])
+            delta = self.crdt.delta(before)
+        # Only elements new to this node are logged, so an idle replicate
+        # leaves the checkpoint clean.
+        if self.checkpoint and delta:
+            self.checkpoint.append(delta)
         self.reply(req=req, body={"type": "add_ok"})
 
     def replicate(self, req: dict) -> None:
         with lock(self.lock):
+            before = self.crdt
             self.crdt = self.crdt.merge(req["body"]["value"])
+            delta = self.crdt.delta(before)
+        if self.checkpoint and delta:
+            self.checkpoint.append(delta)
 
     def handle_message(self, req: dict) -> None:
         match req.get("body", {}).get("type"):
@@ -119,18 +141,7 @@ class CRDTServer(Node):
 
 def run():
     node = CRDTServer(crdt=GSet())
-
-    for line in fileinput.input(files=["-"]):
-        req = json.loads(line)
-
-        handler = None
-        if msg_id := req.get("body", {}).get("in_reply_to"):
-            callback = node.callbacks.pop(msg_id)
-            handler = lambda: callback(req)
-        else:
-            handler = lambda: node.handle_message(req=req)
-
-        Thread(target=handler).start()
+    node.serve(handler=node.handle_message)
 
 
 if __name__ == "__main__":
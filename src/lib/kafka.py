@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+import asyncio
+import zlib
+from bisect import bisect_left, bisect_right
+from threading import Semaphore
+from typing import Any
+
+from lib.node import Node
+from lib.semaphore_context import lock
+
+
+class Segment:
+    def __init__(self, base_offset: int):
+        self.base_offset = base_offset
+        self.offsets: list[int] = []
+        self.msgs: list[Any] = []
+
+
+class Log:
+    # Append-only segments plus a sparse index holding one base offset per
+    # segment, so a read bisects the index and then a single segment.
+    segment_size = 1024
+
+    def __init__(self):
+        self.segments: list[Segment] = []
+        self.index: list[int] = []
+
+    def append(self, offset: int, msg: Any) -> None:
+        if not self.segments or self.segment_size <= len(self.segments[-1].offsets):
+            self.segments.append(Segment(base_offset=offset))
+            self.index.append(offset)
+        segment = self.segments[-1]
+        segment.offsets.append(offset)
+        segment.msgs.append(msg)
+
+    def read(self, offset: int, limit: int) -> list[list[Any]]:
+        result: list[list[Any]] = []
+        i = max(bisect_right(self.index, offset) - 1, 0)
+        for segment in self.segments[i:]:
+            j = bisect_left(segment.offsets, offset)
+            for o, m in zip(
+                segment.offsets[j : j + limit - len(result)], segment.msgs[j:]
+            ):
+                result.append([o, m])
+            if limit <= len(result):
+                break
+        return result
+
+
+class OffsetAllocator:
+    # Offsets are reserved from lin-kv a block at a time and handed out locally,
+    # so only one send in `batch` pays for a round trip.
+    batch = 100
+
+    def __init__(self, node: Node, key: str):
+        self.node = node
+        self.key = f"offset/{key}"
+        self.next = 0
+        self.limit = 0
+
+    async def reserve(self) -> None:
+        while True:
+            resp = await self.node.sync_rpc(
+                dest="lin-kv", body={"type": "read", "key": self.key}
+            )
+            current = (
+                resp["body"].get("value", 0) if resp["body"]["type"] == "read_ok" else 0
+            )
+
+            resp = await self.node.sync_rpc(
+                dest="lin-kv",
+                body={
+                    "type": "cas",
+                    "key": self.key,
+                    "from": current,
+                    "to": current + self.batch,
+                    "create_if_not_exists": True,
+                },
+            )
+            if resp["body"]["type"] == "cas_ok":
+                self.next, self.limit = current, current + self.batch
+                return
+
+    async def allocate(self) -> int:
+        if self.limit <= self.next:
+            await self.reserve()
+        offset = self.next
+        self.next += 1
+        return offset
+
+
+class Partition:
+    def __init__(self, node: Node, key: str):
+        self.log = Log()
+        self.offsets = OffsetAllocator(node=node, key=key)
+        self.committed: int | None = None
+        self.lock = Semaphore()
+
+
+class KafkaNode(Node):
+    poll_limit = 100
+
+    def __init__(self):
+        super().__init__()
+        self.partitions: dict[str, Partition] = {}
+        self.partitions_lock = Semaphore()
+
+    def leader(self, key: str) -> str:
+        return self.node_ids[zlib.crc32(key.encode()) % len(self.node_ids)]
+
+    def partition(self, key: str) -> Partition:
+        with lock(self.partitions_lock):
+            if (p := self.partitions.get(key)) is None:
+                p = self.partitions[key] = Partition(node=self, key=key)
+        return p
+
+    def by_leader(self, keys: list[str]) -> dict[str, list[str]]:
+        result: dict[str, list[str]] = {}
+        for k in keys:
+            result.setdefault(self.leader(k), []).append(k)
+        return result
+
+    async def send_local(self, key: str, msg: Any) -> int:
+        p = self.partition(key)
+        with lock(p.lock):
+            offset = await p.offsets.allocate()
+            p.log.append(offset, msg)
+        return offset
+
+    async def handle_message_async(self, req: dict) -> None:
+        body = req.get("body", {})
+        match body.get("type"):
+            case "init":
+                self.init(node_id=body.get("node_id"), node_ids=body.get("node_ids"))
+                self.reply(req, body={"type": "init_ok"})
+            case "send":
+                key = body["key"]
+                if (leader := self.leader(key)) == self.node_id:
+                    offset = await self.send_local(key, body["msg"])
+                else:
+                    resp = await self.sync_rpc(
+                        dest=leader,
+                        body={"type": "send", "key": key, "msg": body["msg"]},
+                    )
+                    offset = resp["body"]["offset"]
+                self.reply(req, body={"type": "send_ok", "offset": offset})
+            case "poll":
+                offsets: dict[str, int] = body["offsets"]
+                msgs: dict[str, list] = {}
+                for leader, keys in self.by_leader(list(offsets)).items():
+                    if leader == self.node_id:
+                        for k in keys:
+                            msgs[k] = self.partition(k).log.read(
+                                offsets[k], self.poll_limit
+                            )
+                    else:
+                        resp = await self.sync_rpc(
+                            dest=leader,
+                            body={
+                                "type": "poll",
+                                "offsets": {k: offsets[k] for k in keys},
+                            },
+                        )
+                        msgs |= resp["body"]["msgs"]
+                self.reply(req, body={"type": "poll_ok", "msgs": msgs})
+            case "commit_offsets":
+                offsets = body["offsets"]
+                for leader, keys in self.by_leader(list(offsets)).items():
+                    if leader == self.node_id:
+                        for k in keys:
+                            p = self.partition(k)
+                            with lock(p.lock):
+                                p.committed = max(p.committed or 0, offsets[k])
+                    else:
+                        await self.sync_rpc(
+                            dest=leader,
+                            body={
+                                "type": "commit_offsets",
+                                "offsets": {k: offsets[k] for k in keys},
+                            },
+                        )
+                self.reply(req, body={"type": "commit_offsets_ok"})
+            case "list_committed_offsets":
+                committed: dict[str, int] = {}
+                for leader, keys in self.by_leader(body["keys"]).items():
+                    if leader == self.node_id:
+                        for k in keys:
+                            if (c := self.partition(k).committed) is not None:
+                                committed[k] = c
+                    else:
+                        resp = await self.sync_rpc(
+                            dest=leader,
+                            body={"type": "list_committed_offsets", "keys": keys},
+                        )
+                        committed |= resp["body"]["offsets"]
+                self.reply(
+                    req,
+                    body={"type": "list_committed_offsets_ok", "offsets": committed},
+                )
+            case t:
+                raise Exception(f"Unknown message type {t}")
+
+
+def run():
+    node = KafkaNode()
+    node.serve(handler=lambda req: asyncio.run(node.handle_message_async(req=req)))
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except KeyboardInterrupt:
+        exit()
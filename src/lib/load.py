@@ -0,0 +1,458 @@
+import json
+import subprocess
+import sys
+from enum import StrEnum
+from itertools import count
+from random import Random
+from threading import Event, Semaphore, Thread
+from time import perf_counter, sleep
+from typing import Any, Callable, TextIO
+
+from lib.semaphore_context import lock
+
+
+class Mode(StrEnum):
+    OPEN = "open"
+    CLOSED = "closed"
+
+
+type Op = Callable[[Random, int], dict]
+
+
+class Workload:
+    def __init__(
+        self,
+        ops: dict[str, Op],
+        mix: dict[str, float],
+        setup: Callable[[list[str]], list[tuple[str, dict]]] | None = None,
+    ):
+        self.ops = ops
+        self.mix = mix
+        self.setup = setup or (lambda node_ids: [])
+
+    def with_mix(self, mix: dict[str, float]) -> "Workload":
+        unknown = set(mix) - set(self.ops)
+        if unknown:
+            raise ValueError(f"Unknown operations {sorted(unknown)}")
+        return Workload(ops=self.ops, mix=mix, setup=self.setup)
+
+    def choose(self, rng: Random, n: int) -> dict:
+        name = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        return self.ops[name](rng, n)
+
+
+def tree_topology(node_ids: list[str]) -> list[tuple[str, dict]]:
+    topology: dict[str, list[str]] = {n: [] for n in node_ids}
+    for i, n in enumerate(node_ids[1:], start=1):
+        parent = node_ids[(i - 1) // 2]
+        topology[n].append(parent)
+        topology[parent].append(n)
+    return [(n, {"type": "topology", "topology": topology}) for n in node_ids]
+
+
+WORKLOADS: dict[str, Workload] = {
+    "echo": Workload(
+        ops={"echo": lambda rng, n: {"type": "echo", "echo": f"hello {n}"}},
+        mix={"echo": 1},
+    ),
+    "broadcast": Workload(
+        ops={
+            "broadcast": lambda rng, n: {"type": "broadcast", "message": n},
+            "read": lambda rng, n: {"type": "read"},
+        },
+        mix={"broadcast": 1, "read": 1},
+        setup=tree_topology,
+    ),
+    "g_counter": Workload(
+        ops={
+            "add": lambda rng, n: {"type": "add", "delta": rng.randint(0, 5)},
+            "read": lambda rng, n: {"type": "read"},
+        },
+        mix={"add": 1, "read": 1},
+    ),
+    "g_set": Workload(
+        ops={
+            "add": lambda rng, n: {"type": "add", "element": n},
+            "read": lambda rng, n: {"type": "read"},
+        },
+        mix={"add": 1, "read": 1},
+    ),
+    "pn_counter": Workload(
+        ops={
+            "add": lambda rng, n: {"type": "add", "delta": rng.randint(-5, 5)},
+            "read": lambda rng, n: {"type": "read"},
+        },
+        mix={"add": 1, "read": 1},
+    ),
+    "datomic": Workload(
+        ops={
+            "txn": lambda rng, n: {
+                "type": "txn",
+                "txn": [
+                    (
+                        ["r", rng.randint(0, 9), None]
+                        if rng.random() < 0.5
+                        else ["append", rng.randint(0, 9), n]
+                    )
+                    for _ in range(rng.randint(1, 4))
+                ],
+            }
+        },
+        mix={"txn": 1},
+    ),
+    "kafka": Workload(
+        ops={
+            "send": lambda rng, n: {
+                "type": "send",
+                "key": str(rng.randint(0, 9)),
+                "msg": n,
+            },
+            "poll": lambda rng, n: {
+                "type": "poll",
+                "offsets": {str(rng.randint(0, 9)): rng.randint(0, n)},
+            },
+            "commit_offsets": lambda rng, n: {
+                "type": "commit_offsets",
+                "offsets": {str(rng.randint(0, 9)): rng.randint(0, n)},
+            },
+            "list_committed_offsets": lambda rng, n: {
+                "type": "list_committed_offsets",
+                "keys": [str(k) for k in range(10)],
+            },
+        },
+        mix={"send": 4, "poll": 4, "commit_offsets": 1, "list_committed_offsets": 1},
+    ),
+    "txn_rw_register": Workload(
+        ops={
+            "txn": lambda rng, n: {
+                "type": "txn",
+                "txn": [
+                    (
+                        ["r", rng.randint(0, 9), None]
+                        if rng.random() < 0.5
+                        else ["w", rng.randint(0, 9), n]
+                    )
+                    for _ in range(rng.randint(1, 4))
+                ],
+            }
+        },
+        mix={"txn": 1},
+    ),
+    "unique_ids": Workload(
+        ops={"generate": lambda rng, n: {"type": "generate"}},
+        mix={"generate": 1},
+    ),
+}
+
+
+class KVService:
+    def __init__(self):
+        self.data: dict[Any, Any] = {}
+        self.lock = Semaphore()
+
+    def handle(self, body: dict) -> dict:
+        key = body.get("key")
+        with lock(self.lock):
+            match body.get("type"):
+                case "read":
+                    if key not in self.data:
+                        return {
+                            "type": "error",
+                            "code": 20,
+                            "text": "key does not exist",
+                        }
+                    return {"type": "read_ok", "value": self.data[key]}
+                case "write":
+                    self.data[key] = body.get("value")
+                    return {"type": "write_ok"}
+                case "cas":
+                    if key not in self.data:
+                        if not body.get("create_if_not_exists"):
+                            return {
+                                "type": "error",
+                                "code": 20,
+                                "text": "key does not exist",
+                            }
+                    elif self.data[key] != body.get("from"):
+                        return {"type": "error", "code": 22, "text": "cas mismatch"}
+                    self.data[key] = body.get("to")
+                    return {"type": "cas_ok"}
+                case t:
+                    return {"type": "error", "code": 10, "text": f"unsupported {t}"}
+
+
+class Pending:
+    def __init__(self, sent: float):
+        self.sent = sent
+        self.done = Event()
+        self.latency: float | None = None
+        self.completed: float | None = None
+        self.error = False
+
+
+class Cluster:
+    def __init__(self, bin: str, node_count: int, log_stderr: bool = False):
+        self.node_ids = [f"n{i}" for i in range(node_count)]
+        self.services = {"lin-kv": KVService(), "seq-kv": KVService()}
+        self.pending: dict[int, Pending] = {}
+        self.msg_ids = count(1)
+        self.inter_node_msgs = 0
+        self.service_msgs = 0
+        self.lock = Semaphore()
+
+        args = [sys.executable, bin] if bin.endswith(".py") else [bin]
+        self.procs = {
+            n: subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=None if log_stderr else subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+            for n in self.node_ids
+        }
+        self.write_locks = {n: Semaphore() for n in self.node_ids}
+
+        for n, p in self.procs.items():
+            assert p.stdout is not None
+            Thread(target=self.route, args=(n, p.stdout), daemon=True).start()
+
+    def write(self, dest: str, msg: dict) -> None:
+        stdin = self.procs[dest].stdin
+        assert stdin is not None
+        with lock(self.write_locks[dest]):
+            try:
+                stdin.write(json.dumps(msg) + "\n")
+            except (BrokenPipeError, ValueError):
+                pass
+
+    def route(self, node_id: str, stdout: TextIO) -> None:
+        for line in stdout:
+            msg = json.loads(line)
+            dest = msg.get("dest")
+            if dest in self.procs:
+                with lock(self.lock):
+                    self.inter_node_msgs += 1
+                self.write(dest, msg)
+            elif dest in self.services:
+                with lock(self.lock):
+                    self.service_msgs += 1
+                body = self.services[dest].handle(msg["body"])
+                body["in_reply_to"] = msg["body"].get("msg_id")
+                self.write(node_id, {"src": dest, "dest": node_id, "body": body})
+            else:
+                self.complete(msg["body"])
+
+    def complete(self, body: dict) -> None:
+        in_reply_to = body.get("in_reply_to")
+        if in_reply_to is None:
+            return
+        with lock(self.lock):
+            p = self.pending.pop(in_reply_to, None)
+        if p is None:
+            return
+        p.completed = perf_counter()
+        p.latency = p.completed - p.sent
+        p.error = body.get("type") == "error"
+        p.done.set()
+
+    def request(
+        self, client: str, dest: str, body: dict, sent: float | None = None
+    ) -> Pending:
+        msg_id = next(self.msg_ids)
+        p = Pending(sent=perf_counter() if sent is None else sent)
+        with lock(self.lock):
+            self.pending[msg_id] = p
+        self.write(
+            dest, {"src": client, "dest": dest, "body": {**body, "msg_id": msg_id}}
+        )
+        return p
+
+    def init(self, workload: Workload, timeout_s: float = 5) -> None:
+        waits = [
+            self.request(
+                "c0", n, {"type": "init", "node_id": n, "node_ids": self.node_ids}
+            )
+            for n in self.node_ids
+        ]
+        waits += [
+            self.request("c0", n, body) for n, body in workload.setup(self.node_ids)
+        ]
+        for p in waits:
+            if not p.done.wait(timeout_s):
+                raise TimeoutError("Cluster did not finish initialising")
+
+    def reset_counters(self) -> None:
+        with lock(self.lock):
+            self.inter_node_msgs = 0
+            self.service_msgs = 0
+
+    def stop(self) -> None:
+        for p in self.procs.values():
+            p.kill()
+        for p in self.procs.values():
+            p.wait()
+
+
+class Result:
+    def __init__(
+        self,
+        requests: list[Pending],
+        elapsed_s: float,
+        node_count: int,
+        inter_node_msgs: int,
+        service_msgs: int,
+        issued_s: float | None = None,
+    ):
+        self.sent = len(requests)
+        self.issued_s = issued_s
+        self.latencies = sorted(
+            p.latency for p in requests if p.latency is not None and not p.error
+        )
+        self.errors = sum(1 for p in requests if p.error)
+        self.timeouts = sum(1 for p in requests if p.latency is None)
+        self.elapsed_s = elapsed_s
+        self.node_count = node_count
+        self.inter_node_msgs = inter_node_msgs
+        self.service_msgs = service_msgs
+
+    @property
+    def ok(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.ok / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def offered(self) -> float:
+        issued_s = self.issued_s or self.elapsed_s
+        return self.sent / issued_s if issued_s else 0.0
+
+    def msgs_per_op(self) -> float:
+        return (self.inter_node_msgs + self.service_msgs) / self.ok if self.ok else 0.0
+
+    def report(self, label: str) -> str:
+        p50, p99, p999 = (
+            percentile(self.latencies, q) * 1000 for q in (0.5, 0.99, 0.999)
+        )
+        return (
+            f"{label:>10} | offered {self.offered:9.1f}/s | {self.throughput:9.1f} ops/s | {self.throughput / self.node_count:8.1f} ops/s/node"
+            f" | p50 {p50:8.2f}ms | p99 {p99:8.2f}ms | p999 {p999:8.2f}ms"
+            f" | msgs/op {self.msgs_per_op():6.2f}"
+            f" | sent {self.sent} ok {self.ok} err {self.errors} timeout {self.timeouts}"
+        )
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, int(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[i]
+
+
+def open_loop(
+    cluster: Cluster, workload: Workload, rate: float, duration_s: float, rng: Random
+) -> list[Pending]:
+    requests = []
+    clients = [f"c{i + 1}" for i in range(len(cluster.node_ids))]
+    interval = 1 / rate
+    start = perf_counter()
+    # Every scheduled request is issued and timed from when it was due, not
+    # when it was written, so a generator or stdin that falls behind shows up
+    # as latency instead of as a quietly lower rate.
+    for n in range(int(rate * duration_s)):
+        due = start + n * interval
+        if (now := perf_counter()) < due:
+            sleep(due - now)
+        dest = rng.choice(cluster.node_ids)
+        body = workload.choose(rng, n)
+        requests.append(cluster.request(clients[n % len(clients)], dest, body, due))
+    return requests
+
+
+def closed_loop(
+    cluster: Cluster,
+    workload: Workload,
+    concurrency: int,
+    duration_s: float,
+    rng: Random,
+    timeout_s: float,
+) -> list[Pending]:
+    requests: list[Pending] = []
+    requests_lock = Semaphore()
+    ids = count()
+    start = perf_counter()
+
+    def client(i: int) -> None:
+        client_rng = Random(rng.random())
+        while perf_counter() - start < duration_s:
+            dest = client_rng.choice(cluster.node_ids)
+            p = cluster.request(
+                f"c{i + 1}", dest, workload.choose(client_rng, next(ids))
+            )
+            with lock(requests_lock):
+                requests.append(p)
+            p.done.wait(timeout_s)
+
+    threads = [Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return requests
+
+
+def bench(
+    bin: str,
+    workload: Workload,
+    node_count: int,
+    mode: Mode,
+    level: float,
+    duration_s: float,
+    timeout_s: float = 5,
+    seed: int = 0,
+    log_stderr: bool = False,
+) -> Result:
+    cluster = Cluster(bin=bin, node_count=node_count, log_stderr=log_stderr)
+    try:
+        cluster.init(workload)
+        cluster.reset_counters()
+        rng = Random(seed)
+
+        start = perf_counter()
+        match mode:
+            case Mode.OPEN:
+                requests = open_loop(cluster, workload, level, duration_s, rng)
+            case Mode.CLOSED:
+                requests = closed_loop(
+                    cluster, workload, int(level), duration_s, rng, timeout_s
+                )
+        issued_s = perf_counter() - start
+
+        deadline = perf_counter() + timeout_s
+        for p in requests:
+            p.done.wait(max(0, deadline - perf_counter()))
+        elapsed_s = (
+            max((p.completed for p in requests if p.completed), default=start) - start
+        )
+
+        return Result(
+            requests=requests,
+            elapsed_s=elapsed_s,
+            node_count=node_count,
+            inter_node_msgs=cluster.inter_node_msgs,
+            service_msgs=cluster.service_msgs,
+            issued_s=issued_s,
+        )
+    finally:
+        cluster.stop()
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    result = {}
+    for part in filter(None, mix.split(",")):
+        name, _, weight = part.partition("=")
+        result[name] = float(weight or 1)
+    return result
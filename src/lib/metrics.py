@@ -0,0 +1,74 @@
+from collections.abc import Callable
+from threading import Semaphore
+
+from lib.semaphore_context import lock
+
+
+class Histogram:
+    # Power-of-two buckets over microseconds: bucket i holds samples in
+    # [2^(i-1), 2^i) us, so recording is a bit_length and an increment.
+    size = 32
+
+    def __init__(self):
+        self.buckets = [0] * self.size
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def record(self, seconds: float) -> None:
+        i = min(int(seconds * 1_000_000).bit_length(), self.size - 1)
+        self.buckets[i] += 1
+        self.count += 1
+        self.total_s += seconds
+        if seconds > self.max_s:
+            self.max_s = seconds
+
+    def percentile_ms(self, q: float) -> float:
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and target <= seen:
+                return min((1 << i) / 1000, self.max_s * 1000)
+        return self.max_s * 1000
+
+    def to_serializable(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_s * 1000 / self.count if self.count else 0.0,
+            "p50_ms": self.percentile_ms(0.5),
+            "p99_ms": self.percentile_ms(0.99),
+            "max_ms": self.max_s * 1000,
+            "buckets_us": {1 << i: n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.gauges: dict[str, Callable[[], int]] = {}
+        self.lock = Semaphore()
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with lock(self.lock):
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, seconds: float) -> None:
+        with lock(self.lock):
+            if (h := self.histograms.get(name)) is None:
+                h = self.histograms[name] = Histogram()
+            h.record(seconds)
+
+    def gauge(self, name: str, f: Callable[[], int]) -> None:
+        self.gauges[name] = f
+
+    def snapshot(self) -> dict:
+        with lock(self.lock):
+            return {
+                "counters": self.counters.copy(),
+                "histograms": {
+                    k: h.to_serializable() for k, h in self.histograms.items()
+                },
+                "gauges": {k: f() for k, f in self.gauges.items()},
+            }
@@ -1,11 +1,15 @@
-import concurrent.futures
 import json
+import os
 import sys
-from threading import Semaphore, Thread
-from time import sleep
-from typing import Callable
+from collections.abc import Callable
+from threading import Event, Semaphore, Thread, active_count
+from time import perf_counter, sleep
 
+from lib import startup
+from lib.metrics import Metrics
+from lib.profiler import Profiler
 from lib.semaphore_context import lock
+from lib.trace import INBOUND, OUTBOUND, Recorder
 
 
 class Task:
@@ -14,19 +18,87 @@ class Task:
         self.f = f
 
 
+def unbatch(msg: dict) -> list[dict]:
+    if msg.get("body", {}).get("type") != "batch":
+        return [msg]
+    return [
+        {"src": msg["src"], "dest": msg["dest"], "body": b} for b in msg["body"]["msgs"]
+    ]
+
+
 class Node:
     def __init__(self):
         self.node_id = None
         self.node_ids = []
         self.next_msg_id = 0
         self.callbacks: dict[int, Callable[[dict], None]] = {}
+        self.rpc_started: dict[int, float] = {}
         self.tasks: list[Task] = []
         self.lock = Semaphore()
+        self.metrics = Metrics()
+        self.metrics.gauge("pending_callbacks", lambda: len(self.callbacks))
+        self.metrics.gauge("threads", active_count)
+        trace_dir = os.environ.get("MAELSTROM_TRACE_DIR")
+        self.recorder = Recorder(trace_dir) if trace_dir else None
+        self.batch_s = float(os.environ.get("MAELSTROM_BATCH_MS", 0)) / 1000
+        self.outbox: dict[str, list[dict]] = {}
+        self.profiler: Profiler | None = None
 
     def init(self, node_id: str, node_ids: list[str]) -> None:
         self.node_id = node_id
         self.node_ids = node_ids
 
+        if self.recorder:
+            self.recorder.open(node_id)
+
+        if dt_s := float(os.environ.get("MAELSTROM_METRICS_S", 0)):
+
+            def dump() -> None:
+                while True:
+                    sleep(dt_s)
+                    self.log(
+                        json.dumps(
+                            {"node": self.node_id, "metrics": self.metrics.snapshot()}
+                        )
+                    )
+
+            Thread(target=dump, daemon=True).start()
+
+        if os.environ.get("MAELSTROM_PROFILE"):
+            self.profile(enabled=True)
+
+        if self.batch_s:
+
+            def flush() -> None:
+                while True:
+                    sleep(self.batch_s)
+                    with lock(self.lock):
+                        outbox, self.outbox = self.outbox, {}
+                    for dest, bodies in outbox.items():
+                        if len(bodies) == 1:
+                            self.transmit(dest=dest, body=bodies[0])
+                        else:
+                            self.transmit(
+                                dest=dest, body={"type": "batch", "msgs": bodies}
+                            )
+
+            Thread(target=flush, daemon=True).start()
+
+    def profile(self, enabled: bool) -> None:
+        with lock(self.lock):
+            if enabled and self.profiler is None:
+                self.profiler = Profiler(
+                    node_id=str(self.node_id),
+                    directory=os.environ.get(
+                        "MAELSTROM_PROFILE_DIR", "/tmp/maelstrom-profiles"
+                    ),
+                    slow_ms=float(os.environ.get("MAELSTROM_SLOW_MS", 100)),
+                )
+                self.profiler.start()
+            elif not enabled and self.profiler is not None:
+                self.profiler.stop()
+                self.profiler = None
+
     def handle_message(self, req: dict) -> None:
         raise NotImplementedError
 
@@ -38,6 +110,9 @@ class Node:
             print(msg, file=sys.stderr, flush=True)
 
     def reply(self, req: dict, body: dict) -> None:
+        if body.get("type") == "init_ok":
+            startup.mark("init_ok")
+
         with lock(self.lock):
             self.next_msg_id += 1
 
@@ -49,14 +124,77 @@ class Node:
         self.send(dest=req["src"], body=body_)
 
     def send(self, dest: str, body: dict):
-        msg = {"src": self.node_id, "dest": dest, "body": body}
+        self.metrics.incr(f"out.{body.get('type')}")
+        # Only node-to-node traffic is batched; clients and services always
+        # get one message per line.
+        if self.batch_s and dest != self.node_id and dest in self.node_ids:
+            with lock(self.lock):
+                self.outbox.setdefault(dest, []).append(body)
+        else:
+            self.transmit(dest=dest, body=body)
+
+    def transmit(self, dest: str, body: dict) -> None:
+        line = json.dumps({"src": self.node_id, "dest": dest, "body": body})
+        self.metrics.incr("bytes_out", len(line) + 1)
         with lock(self.lock):
-            print(json.dumps(msg), flush=True)
+            if self.recorder:
+                self.recorder.record(OUTBOUND, line)
+            print(line, flush=True)
+
+    def receive(self, line: str) -> list[dict]:
+        if self.recorder:
+            self.recorder.record(INBOUND, line)
+        reqs = unbatch(json.loads(line))
+        self.metrics.incr("bytes_in", len(line))
+        for req in reqs:
+            self.metrics.incr(f"in.{req.get('body', {}).get('type')}")
+        return reqs
+
+    def dispatch(self, req: dict, handler: Callable[[dict], None]) -> None:
+        body = req.get("body", {})
+        if msg_id := body.get("in_reply_to"):
+            with lock(self.lock):
+                callback = self.callbacks.pop(msg_id, None)
+                started = self.rpc_started.pop(msg_id, None)
+            if started is not None:
+                self.metrics.observe(
+                    f"rpc.{body.get('type')}", perf_counter() - started
+                )
+            if callback is not None:
+                callback(req)
+        elif body.get("type") == "stats":
+            self.reply(req, body={"type": "stats_ok", "stats": self.metrics.snapshot()})
+        elif body.get("type") == "profile":
+            profiler = self.profiler
+            cpu = profiler.summary() if profiler else {}
+            self.profile(enabled=body.get("enabled", True))
+            self.reply(req, body={"type": "profile_ok", "cpu": cpu})
+        else:
+            started = perf_counter()
+            profiler = self.profiler
+            profiled = profiler.begin(body.get("type")) if profiler else None
+            try:
+                handler(req)
+            finally:
+                self.metrics.observe(
+                    f"handler.{body.get('type')}", perf_counter() - started
+                )
+                if profiler and profiled:
+                    profiler.end(profiled)
+
+    def serve(self, handler: Callable[[dict], None], threaded: bool = True) -> None:
+        for line in sys.stdin:
+            for req in self.receive(line):
+                if threaded:
+                    Thread(target=self.dispatch, args=(req, handler)).start()
+                else:
+                    self.dispatch(req, handler)
 
     def rpc(self, dest: str, body: dict, handler: Callable[[dict], None]) -> None:
         with lock(self.lock):
             self.next_msg_id += 1
             self.callbacks[self.next_msg_id] = handler
+            self.rpc_started[self.next_msg_id] = perf_counter()
 
         body_ = {
             **body,
@@ -65,10 +203,16 @@ class Node:
         self.send(dest=dest, body=body_)
 
     async def sync_rpc(self, dest: str, body: dict) -> dict:
-        f: concurrent.futures.Future = concurrent.futures.Future()
-        self.rpc(dest=dest, body=body, handler=lambda resp: f.set_result(resp))
-        concurrent.futures.wait([f], timeout=5)
-        return f.result()
+        done = Event()
+        resp: dict = {}
+
+        def handler(r: dict) -> None:
+            resp.update(r)
+            done.set()
+
+        self.rpc(dest=dest, body=body, handler=handler)
+        done.wait()
+        return resp
 
     def repeat(self, dt_s: float, f: Callable[[], None]) -> None:
         self.tasks.append(Task(dt_s=dt_s, f=f))
@@ -76,7 +220,7 @@ class Node:
     def run_tasks(self) -> None:
         for t in self.tasks:
 
-            def repeater() -> None:
+            def repeater(t: Task = t) -> None:
                 while True:
                     t.f()
                     sleep(t.dt_s)
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+from threading import Semaphore, Thread, get_ident
+from time import perf_counter, sleep, thread_time
+from types import FrameType
+
+from lib.semaphore_context import lock
+
+
+def collapse(frame: FrameType | None) -> list[str]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+        )
+        frame = frame.f_back
+    return stack[::-1]
+
+
+class InFlight:
+    def __init__(self, type: str):
+        self.type = type
+        self.started = perf_counter()
+        self.cpu_started = thread_time()
+        self.flagged = False
+
+
+class Profiler:
+    # Samples every thread's stack on a timer. Samples from a thread that is
+    # running a handler are rooted at "handler.<type>", so the collapsed stack
+    # file doubles as a per-handler profile. A handler still running past
+    # `slow_ms` is reported once, with the stack it was sampled in.
+    def __init__(
+        self,
+        node_id: str,
+        directory: str,
+        slow_ms: float,
+        sample_s: float = 0.01,
+        flush_s: float = 5,
+    ):
+        self.node_id = node_id
+        self.directory = directory
+        self.slow_s = slow_ms / 1000
+        self.sample_s = sample_s
+        self.flush_s = flush_s
+        self.inflight: dict[int, InFlight] = {}
+        self.stacks: dict[str, int] = {}
+        self.cpu: dict[str, dict[str, float]] = {}
+        self.running = False
+        self.lock = Semaphore()
+
+    def begin(self, type: str) -> InFlight:
+        h = InFlight(type=type)
+        self.inflight[get_ident()] = h
+        return h
+
+    def end(self, h: InFlight) -> None:
+        cpu_s = thread_time() - h.cpu_started
+        wall_s = perf_counter() - h.started
+        self.inflight.pop(get_ident(), None)
+        with lock(self.lock):
+            totals = self.cpu.setdefault(
+                h.type, {"count": 0, "cpu_s": 0.0, "wall_s": 0.0}
+            )
+            totals["count"] += 1
+            totals["cpu_s"] += cpu_s
+            totals["wall_s"] += wall_s
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        Thread(target=self.sample, daemon=True).start()
+
+    def stop(self) -> None:
+        self.running = False
+
+    def sample(self) -> None:
+        me = get_ident()
+        last_flush = perf_counter()
+        while self.running:
+            sleep(self.sample_s)
+            now = perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = collapse(frame)
+                if (h := self.inflight.get(ident)) is not None:
+                    stack.insert(0, f"handler.{h.type}")
+                    if not h.flagged and self.slow_s <= now - h.started:
+                        h.flagged = True
+                        print(
+                            json.dumps(
+                                {
+                                    "node": self.node_id,
+                                    "slow_handler": h.type,
+                                    "ms": (now - h.started) * 1000,
+                                    "stack": stack,
+                                }
+                            ),
+                            file=sys.stderr,
+                            flush=True,
+                        )
+                key = ";".join(stack)
+                with lock(self.lock):
+                    self.stacks[key] = self.stacks.get(key, 0) + 1
+            if self.flush_s <= now - last_flush:
+                self.flush()
+                last_flush = now
+        self.flush()
+
+    def summary(self) -> dict:
+        with lock(self.lock):
+            return {k: v.copy() for k, v in self.cpu.items()}
+
+    def flush(self) -> None:
+        with lock(self.lock):
+            stacks = self.stacks.copy()
+        path = os.path.join(self.directory, f"{self.node_id}")
+        with open(f"{path}.stacks", "w") as f:
+            f.writelines(f"{k} {n}\n" for k, n in stacks.items())
+        with open(f"{path}.cpu.json", "w") as f:
+            json.dump(self.summary(), f)
@@ -0,0 +1,182 @@
+import json
+import subprocess
+import sys
+from threading import Semaphore, Thread
+from time import perf_counter, sleep
+from typing import TextIO
+
+from lib.load import Pending, Result
+from lib.node import unbatch
+from lib.semaphore_context import lock
+from lib.trace import INBOUND, OUTBOUND
+
+
+def read_trace(path: str) -> list[tuple[float, str, dict]]:
+    entries: list[tuple[float, str, dict]] = []
+    t_s = 0.0
+    with open(path) as f:
+        for line in f:
+            dt_us, direction, msg = line.split(" ", 2)
+            t_s += int(dt_us) / 1_000_000
+            entries.extend((t_s, direction, m) for m in unbatch(json.loads(msg)))
+    return entries
+
+
+def is_node(id: str) -> bool:
+    return id.startswith("n")
+
+
+def is_client(id: str) -> bool:
+    return id.startswith("c")
+
+
+class Replay:
+    # Messages that set a node up rather than exercise it. They are sent and
+    # answered before timing starts, matching Cluster.init in the load
+    # generator.
+    setup_types = ("init", "topology")
+
+    def __init__(self, trace: list[tuple[float, str, dict]]):
+        # Replies to the node's own RPCs are not fed on the original schedule:
+        # they are held back and sent when the replayed node issues the matching
+        # request, rewritten to point at its new msg_id.
+        requests = {
+            msg["body"]["msg_id"]: msg
+            for _, direction, msg in trace
+            if direction == OUTBOUND
+            and "msg_id" in msg["body"]
+            and "in_reply_to" not in msg["body"]
+        }
+        self.stubs: dict[tuple[str, str], list[dict]] = {}
+        self.feed: list[tuple[float, dict]] = []
+
+        for t_s, direction, msg in trace:
+            body = msg["body"]
+            if direction != INBOUND:
+                continue
+            if (in_reply_to := body.get("in_reply_to")) is not None:
+                if (request := requests.pop(in_reply_to, None)) is not None:
+                    key = (request["dest"], request["body"].get("type"))
+                    self.stubs.setdefault(key, []).append(msg)
+            else:
+                self.feed.append((t_s, msg))
+
+        self.lock = Semaphore()
+        self.pending: dict[tuple[str, int], Pending] = {}
+        self.peer_msgs = 0
+        self.service_msgs = 0
+
+    def run(
+        self, bin: str, speed: float, timeout_s: float, log_stderr: bool = False
+    ) -> Result:
+        args = [sys.executable, bin] if bin.endswith(".py") else [bin]
+        proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None if log_stderr else subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        assert proc.stdin is not None and proc.stdout is not None
+        stdin = proc.stdin
+        write_lock = Semaphore()
+
+        def write(msg: dict) -> None:
+            with lock(write_lock):
+                try:
+                    stdin.write(json.dumps(msg) + "\n")
+                except (BrokenPipeError, ValueError):
+                    pass
+
+        Thread(target=self.route, args=(proc.stdout, write), daemon=True).start()
+
+        def issue(msg: dict) -> Pending | None:
+            p = None
+            if (msg_id := msg["body"].get("msg_id")) is not None:
+                p = Pending(sent=perf_counter())
+                with lock(self.lock):
+                    self.pending[(msg["src"], msg_id)] = p
+            write(msg)
+            return p
+
+        setup = [m for _, m in self.feed if m["body"].get("type") in self.setup_types]
+        feed = [
+            (t, m)
+            for t, m in self.feed
+            if m["body"].get("type") not in self.setup_types
+        ]
+
+        requests = []
+        try:
+            # Boot the node before the clock starts, so neither process
+            # startup nor setup counts towards the results.
+            deadline = perf_counter() + timeout_s
+            for p in [p for m in setup if (p := issue(m)) is not None]:
+                if not p.done.wait(max(0, deadline - perf_counter())):
+                    raise TimeoutError("Node did not finish initialising")
+
+            start = perf_counter()
+            t0 = feed[0][0] if feed else 0.0
+            for t_s, msg in feed:
+                if speed:
+                    due = start + (t_s - t0) / speed
+                    if (now := perf_counter()) < due:
+                        sleep(due - now)
+                if (p := issue(msg)) is not None:
+                    requests.append(p)
+
+            deadline = perf_counter() + timeout_s
+            for p in requests:
+                p.done.wait(max(0, deadline - perf_counter()))
+        finally:
+            proc.kill()
+            proc.wait()
+
+        return Result(
+            requests=requests,
+            elapsed_s=max((p.completed for p in requests if p.completed), default=start)
+            - start,
+            node_count=1,
+            inter_node_msgs=self.peer_msgs,
+            service_msgs=self.service_msgs,
+        )
+
+    def route(self, stdout: TextIO, write) -> None:
+        for line in stdout:
+            for msg in unbatch(json.loads(line)):
+                self.route_message(msg, write)
+
+    def route_message(self, msg: dict, write) -> None:
+        body = msg["body"]
+        dest = msg["dest"]
+
+        if not is_client(dest):
+            with lock(self.lock):
+                if is_node(dest):
+                    self.peer_msgs += 1
+                else:
+                    self.service_msgs += 1
+
+        if (in_reply_to := body.get("in_reply_to")) is not None:
+            with lock(self.lock):
+                p = self.pending.pop((dest, in_reply_to), None)
+            if p is not None:
+                p.completed = perf_counter()
+                p.latency = p.completed - p.sent
+                p.error = body.get("type") == "error"
+                p.done.set()
+        elif (msg_id := body.get("msg_id")) is not None:
+            with lock(self.lock):
+                stubs = self.stubs.get((dest, body.get("type")))
+                reply = stubs.pop(0) if stubs else None
+            if reply is not None:
+                write({**reply, "body": {**reply["body"], "in_reply_to": msg_id}})
+
+
+def replay(
+    path: str, bin: str, speed: float, timeout_s: float, log_stderr: bool = False
+) -> Result:
+    return Replay(trace=read_trace(path)).run(
+        bin=bin, speed=speed, timeout_s=timeout_s, log_stderr=log_stderr
+    )
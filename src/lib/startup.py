@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+from time import perf_counter
+
+
+def process_start() -> float:
+    # The perf_counter() reading when the process was created, worked out from
+    # its start time in /proc so interpreter startup is included. Falls back
+    # to now, i.e. import time, where /proc is unavailable.
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, counted after the parenthesised command name.
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return perf_counter()
+    return perf_counter() - (uptime - ticks / os.sysconf("SC_CLK_TCK"))
+
+
+enabled = bool(os.environ.get("MAELSTROM_PROFILE_STARTUP"))
+started = process_start() if enabled else perf_counter()
+marks: dict[str, float] = {}
+
+
+def mark(name: str, **fields: str) -> None:
+    if not enabled or name in marks:
+        return
+    ms = marks[name] = (perf_counter() - started) * 1000
+    print(
+        json.dumps({"startup": name, "ms": round(ms, 3), **fields}),
+        file=sys.stderr,
+        flush=True,
+    )
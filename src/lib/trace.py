@@ -0,0 +1,43 @@
+import os
+from io import TextIOWrapper
+from threading import Semaphore
+from time import perf_counter
+
+from lib.semaphore_context import lock
+
+INBOUND = "i"
+OUTBOUND = "o"
+
+
+class Recorder:
+    # One line per message: "<us since previous line> <i|o> <json>". Lines seen
+    # before init are buffered until the node id, and so the file name, is known.
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.last = perf_counter()
+        self.buffer: list[str] = []
+        self.file: TextIOWrapper | None = None
+        self.lock = Semaphore()
+
+    def open(self, node_id: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with lock(self.lock):
+            if self.file is not None:
+                return
+            self.file = open(os.path.join(self.directory, f"{node_id}.trace"), "w")
+            self.file.writelines(self.buffer)
+            self.file.flush()
+            self.buffer = []
+
+    def record(self, direction: str, line: str) -> None:
+        with lock(self.lock):
+            now = perf_counter()
+            entry = (
+                f"{int((now - self.last) * 1_000_000)} {direction} {line.rstrip()}\n"
+            )
+            self.last = now
+            if self.file is None:
+                self.buffer.append(entry)
+            else:
+                self.file.write(entry)
+                self.file.flush()
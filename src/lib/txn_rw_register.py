@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+from bisect import bisect_right, insort
+from enum import StrEnum
+from threading import Semaphore
+from time import perf_counter, time_ns
+from typing import Any
+
+from lib.node import Node
+from lib.semaphore_context import lock
+
+
+class TransactionOp(StrEnum):
+    READ = "r"
+    WRITE = "w"
+
+
+type Transaction = tuple[TransactionOp, Any, Any]
+type Version = tuple[int, str]
+type Write = tuple[Any, int, str, Any]
+
+
+class Store:
+    # Every key keeps its most recent versions ordered by (timestamp, node id).
+    # A transaction reads the newest version at or before its start, so writes
+    # replicated in from peers settle by last-writer-wins whatever order they
+    # arrive in.
+    max_versions = 8
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.versions: dict[Any, list[tuple[Version, Any]]] = {}
+        self.clock = 0
+        self.lock = Semaphore()
+
+    def tick(self) -> Version:
+        self.clock = max(self.clock + 1, time_ns() // 1000)
+        return (self.clock, self.node_id)
+
+    def get(self, key: Any, as_of: Version) -> Any:
+        versions = self.versions.get(key, [])
+        i = bisect_right(versions, as_of, key=lambda v: v[0])
+        return versions[i - 1][1] if i else None
+
+    def put(self, key: Any, version: Version, value: Any) -> None:
+        versions = self.versions.setdefault(key, [])
+        insort(versions, (version, value), key=lambda v: v[0])
+        if self.max_versions < len(versions):
+            del versions[0]
+
+    def transact(
+        self, transaction: list[Transaction]
+    ) -> tuple[list[Transaction], list[Write]]:
+        result: list[Transaction] = []
+        local: dict[Any, Any] = {}
+        with lock(self.lock):
+            as_of = self.tick()
+            for f, k, v in transaction:
+                match f:
+                    case TransactionOp.READ:
+                        result.append(
+                            (f, k, local[k] if k in local else self.get(k, as_of))
+                        )
+                    case TransactionOp.WRITE:
+                        local[k] = v
+                        result.append((f, k, v))
+            if not local:
+                return result, []
+            ts, node_id = self.tick()
+            for k, v in local.items():
+                self.put(k, (ts, node_id), v)
+        return result, [(k, ts, node_id, v) for k, v in local.items()]
+
+    def merge(self, writes: list[Write]) -> None:
+        with lock(self.lock):
+            for k, ts, node_id, v in writes:
+                self.clock = max(self.clock, ts)
+                self.put(k, (ts, node_id), v)
+
+
+class Outbox:
+    # Write-sets waiting to reach one peer. Only one batch is in flight at a
+    # time; it is resent after `retry_s` until the peer acks its highest
+    # sequence number.
+    batch_size = 1000
+    retry_s = 1.0
+
+    def __init__(self):
+        self.writes: list[tuple[int, Write]] = []
+        self.next_seq = 0
+        self.in_flight_until = 0.0
+        self.lock = Semaphore()
+
+    def extend(self, writes: list[Write]) -> None:
+        with lock(self.lock):
+            for w in writes:
+                self.writes.append((self.next_seq, w))
+                self.next_seq += 1
+
+    def batch(self) -> tuple[int, list[Write]]:
+        with lock(self.lock):
+            now = perf_counter()
+            if now < self.in_flight_until:
+                return -1, []
+            batch = self.writes[: self.batch_size]
+            if batch:
+                self.in_flight_until = now + self.retry_s
+        return (batch[-1][0] if batch else -1), [w for _, w in batch]
+
+    def ack(self, up_to: int) -> None:
+        with lock(self.lock):
+            self.writes = [(seq, w) for seq, w in self.writes if up_to < seq]
+            self.in_flight_until = 0.0
+
+
+class RegisterNode(Node):
+    replicate_dt_s = 0.1
+
+    def __init__(self):
+        super().__init__()
+        self.store = Store(node_id="")
+        self.outboxes: dict[str, Outbox] = {}
+
+    def init(self, node_id: str, node_ids: list[str]) -> None:
+        super().init(node_id, node_ids)
+        self.store = Store(node_id=node_id)
+        self.outboxes = {n: Outbox() for n in node_ids if n != node_id}
+
+        def replicate():
+            for peer, outbox in self.outboxes.items():
+                up_to, writes = outbox.batch()
+                # Sent without a msg_id: the ack comes back as a plain
+                # replicate_ok message, so a lost batch leaves no callback
+                # behind.
+                if writes:
+                    self.send(
+                        dest=peer,
+                        body={"type": "replicate", "writes": writes, "up_to": up_to},
+                    )
+
+        self.repeat(dt_s=self.replicate_dt_s, f=replicate)
+        self.run_tasks()
+
+    def handle_message(self, req: dict) -> None:
+        body = req.get("body", {})
+        match body.get("type"):
+            case "init":
+                self.init(node_id=body.get("node_id"), node_ids=body.get("node_ids"))
+                self.reply(req, body={"type": "init_ok"})
+            case "txn":
+                transaction, writes = self.store.transact(body["txn"])
+                for outbox in self.outboxes.values():
+                    outbox.extend(writes)
+                self.reply(req, body={"type": "txn_ok", "txn": transaction})
+            case "replicate":
+                self.store.merge([tuple(w) for w in body["writes"]])
+                self.send(
+                    dest=req["src"],
+                    body={"type": "replicate_ok", "up_to": body["up_to"]},
+                )
+            case "replicate_ok":
+                if (outbox := self.outboxes.get(req["src"])) is not None:
+                    outbox.ack(body["up_to"])
+            case t:
+                raise Exception(f"Unknown message type {t}")
+
+
+def run():
+    node = RegisterNode()
+    node.serve(handler=node.handle_message)
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except KeyboardInterrupt:
+        exit()
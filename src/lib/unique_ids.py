@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+from itertools import count
+from time import time_ns
+
+from lib.node import Node
+
+
+class IdAllocator:
+    # Snowflake layout: milliseconds since `epoch_ms`, then the node index, then
+    # a per-millisecond sequence. Timestamp and sequence are both taken from one
+    # itertools.count, whose next() is atomic under the GIL, so allocation needs
+    # no lock. The wall clock is read once at startup; after that the timestamp
+    # is logical, advancing one millisecond per 4096 ids, so within a running
+    # process a clock stepping backwards cannot cause a repeat. A restarted
+    # node reseeds from the wall clock and nothing is persisted, so it relies
+    # on the clock being past the last timestamp the previous process used;
+    # a backwards step, or a run that outpaced 4096 ids/ms, can break that.
+    epoch_ms = 1_700_000_000_000
+    node_bits = 10
+    sequence_bits = 12
+
+    def __init__(self, node_index: int):
+        if not 0 <= node_index < 1 << self.node_bits:
+            raise ValueError(
+                f"Node index {node_index} does not fit in {self.node_bits} bits"
+            )
+        self.node_index = node_index
+        now_ms = time_ns() // 1_000_000
+        self.counter = count((now_ms - self.epoch_ms) << self.sequence_bits)
+
+    def next(self) -> int:
+        c = next(self.counter)
+        timestamp = c >> self.sequence_bits
+        sequence = c & ((1 << self.sequence_bits) - 1)
+        return (
+            (timestamp << (self.node_bits + self.sequence_bits))
+            | (self.node_index << self.sequence_bits)
+            | sequence
+        )
+
+
+class UniqueIdNode(Node):
+    def __init__(self):
+        super().__init__()
+        self.ids: IdAllocator | None = None
+
+    def init(self, node_id: str, node_ids: list[str]) -> None:
+        super().init(node_id, node_ids)
+        self.ids = IdAllocator(node_index=node_ids.index(node_id))
+
+    def handle_message(self, req: dict) -> None:
+        match req.get("body", {}).get("type"):
+            case "init":
+                self.init(
+                    node_id=req.get("body", {}).get("node_id"),
+                    node_ids=req.get("body", {}).get("node_ids"),
+                )
+                self.reply(req, body={"type": "init_ok"})
+            case "generate":
+                assert self.ids is not None
+                self.reply(req, body={"type": "generate_ok", "id": self.ids.next()})
+            case t:
+                raise Exception(f"Unknown message type {t}")
+
+
+def run():
+    node = UniqueIdNode()
+    node.serve(handler=node.handle_message, threaded=False)
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except KeyboardInterrupt:
+        exit()
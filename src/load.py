@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+
+from lib.load import WORKLOADS, Mode, bench, parse_mix
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description="Drive a workbench binary over the Maelstrom protocol and report throughput and latency."
+    )
+
+    parser.add_argument(
+        "-w",
+        type=str,
+        required=True,
+        choices=sorted(WORKLOADS),
+        help="The workload to generate",
+    )
+    parser.add_argument(
+        "--bin",
+        type=str,
+        required=True,
+        help="The node binary, e.g. ./src/broadcast.py",
+    )
+    parser.add_argument("--node-count", type=int, default=3)
+    parser.add_argument(
+        "--mode",
+        type=Mode,
+        default=Mode.OPEN,
+        help="open: fixed request rate | closed: fixed number of outstanding clients",
+    )
+    parser.add_argument(
+        "--rate",
+        type=str,
+        default="100",
+        help="Comma separated request rates (open) or client counts (closed) to sweep",
+    )
+    parser.add_argument(
+        "--mix",
+        type=str,
+        default="",
+        help="Operation weights, e.g. broadcast=4,read=1",
+    )
+    parser.add_argument("--time-limit", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-stderr", action="store_true")
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args()
+
+    workload = WORKLOADS[args.w]
+    if args.mix:
+        workload = workload.with_mix(parse_mix(args.mix))
+
+    try:
+        for level in map(float, args.rate.split(",")):
+            result = bench(
+                bin=args.bin,
+                workload=workload,
+                node_count=args.node_count,
+                mode=args.mode,
+                level=level,
+                duration_s=args.time_limit,
+                timeout_s=args.timeout,
+                seed=args.seed,
+                log_stderr=args.log_stderr,
+            )
+            print(result.report(label=f"{args.mode} {level:g}"), flush=True)
+            if args.mode == Mode.OPEN and result.offered < 0.95 * level:
+                print(
+                    f"warning: the generator fell behind, offering {result.offered:.1f}/s"
+                    f" of the requested {level:g}/s; latencies include the backlog",
+                    file=sys.stderr,
+                    flush=True,
+                )
+    except KeyboardInterrupt:
+        exit()
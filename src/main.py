@@ -1,8 +1,9 @@
-import argparse
+# Imported first so its clock starts before anything else is loaded.
+from lib import startup
+
 import sys
 from enum import StrEnum
-
-from lib import broadcast, datomic, echo, g_counter, g_set, pn_counter
+from importlib import import_module
 
 
 class Workbench(StrEnum):
@@ -11,10 +12,30 @@ class Workbench(StrEnum):
     ECHO = "echo"
     G_COUNTER = "g_counter"
     G_SET = "g_set"
+    KAFKA = "kafka"
     PN_COUNTER = "pn_counter"
+    TXN_RW_REGISTER = "txn_rw_register"
+    UNIQUE_IDS = "unique_ids"
+
+
+# Workbench modules are only imported once selected, so a node process pays
+# for its own dependencies and nothing else.
+WORKBENCHES: dict[Workbench, str] = {
+    Workbench.BROADCAST: "lib.broadcast",
+    Workbench.DATOMIC: "lib.datomic",
+    Workbench.ECHO: "lib.echo",
+    Workbench.G_COUNTER: "lib.g_counter",
+    Workbench.G_SET: "lib.g_set",
+    Workbench.KAFKA: "lib.kafka",
+    Workbench.PN_COUNTER: "lib.pn_counter",
+    Workbench.TXN_RW_REGISTER: "lib.txn_rw_register",
+    Workbench.UNIQUE_IDS: "lib.unique_ids",
+}
 
 
 def make_parser():
+    import argparse
+
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
@@ -28,19 +49,9 @@ def make_parser():
 
 
 def main(workbench: Workbench):
-    match workbench:
-        case Workbench.BROADCAST:
-            broadcast.run()
-        case Workbench.DATOMIC:
-            datomic.run()
-        case Workbench.ECHO:
-            echo.run()
-        case Workbench.G_COUNTER:
-            g_counter.run()
-        case Workbench.G_SET:
-            g_set.run()
-        case Workbench.PN_COUNTER:
-            pn_counter.run()
+    module = import_module(WORKBENCHES[workbench])
+    startup.mark("imported", workbench=workbench)
+    module.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import argparse
+
+from lib.replay import replay
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description="Feed a recorded node trace back into a workbench binary and report throughput and latency."
+    )
+
+    parser.add_argument(
+        "trace", type=str, help="A trace written under MAELSTROM_TRACE_DIR"
+    )
+    parser.add_argument(
+        "--bin",
+        type=str,
+        required=True,
+        help="The node binary, e.g. ./src/broadcast.py",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="Playback speed relative to the recording; 0 replays as fast as possible",
+    )
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--log-stderr", action="store_true")
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_parser()
+    args = parser.parse_args()
+
+    try:
+        result = replay(
+            path=args.trace,
+            bin=args.bin,
+            speed=args.speed,
+            timeout_s=args.timeout,
+            log_stderr=args.log_stderr,
+        )
+        print(result.report(label="replay"), flush=True)
+    except KeyboardInterrupt:
+        exit()
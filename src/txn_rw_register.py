@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+
+if __name__ == "__main__":
+
+    from main import Workbench, main
+
+    try:
+        main(Workbench.TXN_RW_REGISTER)
+    except KeyboardInterrupt:
+        exit()